@@ -1,17 +1,25 @@
 import streamlit as st
 import os
 import tempfile
-from PIL import Image
 import io
 import base64
+import hashlib
+import contextlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from dotenv import load_dotenv
-load_dotenv()
+# Streamlit re-executes this script on every interaction; .env only needs parsing once per session
+if "_env_loaded" not in st.session_state:
+    load_dotenv()
+    st.session_state._env_loaded = True
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 
 # Import your existing functions
-from brain_of_the_doctor import encode_image, analyze_image_with_query
-from voice_of_the_patient import record_audio, transcribe_with_groq
-from voice_of_the_doctor import text_to_speech_with_gtts, text_to_speech_with_elevenlabs
+from brain_of_the_doctor import get_groq_client, encode_image_bytes, downscale_image, reduce_photo, analyze_image_with_query
+from voice_of_the_patient import record_and_transcribe, transcribe_with_groq, stt_model
+from voice_of_the_doctor import text_to_speech_with_gtts, stream_tts_with_elevenlabs, ELEVENLABS_VOICE
 
 # System prompt (same as in your gradio app)
 system_prompt = """You have to act as a professional doctor, i know you are not but this is for learning purpose. 
@@ -23,46 +31,216 @@ system_prompt = """You have to act as a professional doctor, i know you are not
             Keep your answer concise (max 2 sentences). No preamble, start your answer right away please"""
 
 def save_uploaded_image(uploaded_file):
-    """Save uploaded image to a temporary file and return the path"""
+    """Return the uploaded image bytes and MIME type, without touching disk"""
     if uploaded_file is not None:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            return tmp_file.name
-    return None
-
-def save_audio_file(audio_bytes):
-    """Save audio bytes to a temporary file and return the path"""
-    if audio_bytes is not None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-            tmp_file.write(audio_bytes)
-            return tmp_file.name
-    return None
-
-def process_inputs(audio_filepath, image_filepath):
-    """Process audio and image inputs (same logic as your gradio app)"""
-    speech_to_text_output = ""
+        return uploaded_file.getvalue(), uploaded_file.type or 'image/jpeg'
+    return None, None
+
+# Streamlit re-executes this script on every rerun, so the worker pool is kept
+# in st.cache_resource to reuse the same threads across reruns
+@st.cache_resource
+def get_executor():
+    return ThreadPoolExecutor(max_workers=4)
+
+# Speech synthesis holds a worker for a whole ElevenLabs stream (two per request
+# when gTTS is hedged in), so it gets its own pool and can't starve STT/encoding
+@st.cache_resource
+def get_tts_executor():
+    return ThreadPoolExecutor(max_workers=8)
+
+def content_hash(data):
+    """Return a short BLAKE2b hex digest used as a cache key for raw bytes"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# Temp artifacts live in one directory, named by content hash, and only the
+# most recently used MAX_CACHED_FILES are kept on disk
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "tsangam")
+MAX_CACHED_FILES = 32
+
+@st.cache_resource
+def get_tmp_lru():
+    """Process-wide LRU of temp file paths, shared across reruns and sessions.
+    Files left by earlier processes are seeded oldest-first by mtime so they
+    are evicted too."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    existing = []
+    for directory in (CACHE_DIR, STATIC_DIR):
+        if os.path.isdir(directory):
+            existing += [os.path.join(directory, name) for name in os.listdir(directory)]
+    lru = OrderedDict((path, None) for path in sorted(existing, key=os.path.getmtime))
+    evict_lru(lru)
+    return lru, threading.Lock()
+
+def evict_lru(lru):
+    """Delete the oldest files until at most MAX_CACHED_FILES remain"""
+    while len(lru) > MAX_CACHED_FILES:
+        old_path, _ = lru.popitem(last=False)
+        # Other code (stopped TTS streams, Clear Cache) may have deleted it already
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(old_path)
+
+def touch_lru(path):
+    """Mark path as recently used and delete the oldest files beyond the limit"""
+    lru, lock = get_tmp_lru()
+    with lock:
+        lru[path] = None
+        lru.move_to_end(path)
+        evict_lru(lru)
+
+def content_path(data, suffix):
+    """Write data to a path derived from its hash (once) and return the path"""
+    get_tmp_lru()
+    path = os.path.join(CACHE_DIR, content_hash(data) + suffix)
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    touch_lru(path)
+    return path
+
+# Results are keyed on the content hash (and model); underscore-prefixed args are
+# not hashed by Streamlit, so repeat submissions of the same bytes skip the API call.
+@st.cache_data(show_spinner=False, max_entries=128)
+def cached_transcription(audio_hash, stt_model, _audio_filepath):
+    """Transcribe audio with Groq, memoized by audio content hash"""
+    return transcribe_with_groq(
+        GROQ_API_KEY=GROQ_API_KEY,
+        audio_filepath=_audio_filepath,
+        stt_model=stt_model,
+        client=get_groq_client()
+    )
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def cached_image_analysis(image_hash, system_hash, query_hash, model, _query, _encoded_image, _mime_type):
+    """Analyze image with the LLM, memoized by image content, system prompt and query hash"""
+    return analyze_image_with_query(
+        system=system_prompt,
+        client=get_groq_client(),
+        query=_query,
+        encoded_image=_encoded_image,
+        model=model,
+        mime_type=_mime_type
+    )
+
+# Seconds to wait for ElevenLabs before also starting gTTS as a hedge
+TTS_HEDGE_DELAY = 2.0
+
+# Previews are written once to Streamlit's static folder and shown by URL, so
+# reruns don't re-upload the image bytes to the browser
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_SUFFIXES = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/bmp': '.bmp'}
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def cached_preview(image_hash, mime_type, _image_bytes):
+    """Downscale an image for preview, memoized by image content hash"""
+    return downscale_image(_image_bytes, mime_type)
+
+def static_image_url(image_bytes, mime_type):
+    """Save a downscaled preview under ./static (once) and return its app URL"""
+    image_hash = content_hash(image_bytes)
+    preview_bytes, preview_mime = cached_preview(image_hash, mime_type, image_bytes)
+    # Name the file after the preview's own format: downscaling re-encodes to JPEG
+    filename = image_hash + STATIC_SUFFIXES.get(preview_mime, '.jpg')
+    path = os.path.join(STATIC_DIR, filename)
+    if not os.path.exists(path):
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(preview_bytes)
+    touch_lru(path)
+    # Streamlit only treats strings starting with /app/static/ as static URLs
+    return f"/app/static/{filename}"
+
+def tts_filepath(text_hash, voice):
+    """Deterministic output path for the synthesized audio of a given text"""
+    get_tmp_lru()
+    path = os.path.join(CACHE_DIR, f"tts_{voice}_{text_hash}.mp3")
+    touch_lru(path)
+    return path
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_tts(text_hash, voice, _text, _stop_event=None):
+    """Synthesize speech with ElevenLabs, memoized by text hash and voice.
+    Chunks are written to disk and buffered in memory as they stream in."""
+    audio_buffer = io.BytesIO()
+    for chunk in stream_tts_with_elevenlabs(
+        input_text=_text,
+        output_filepath=tts_filepath(text_hash, voice),
+        voice=voice,
+        stop_event=_stop_event
+    ):
+        audio_buffer.write(chunk)
+    if _stop_event is not None and _stop_event.is_set():
+        # Raising keeps the truncated audio out of the cache
+        raise RuntimeError("ElevenLabs synthesis stopped after gTTS answered first")
+    return audio_buffer.getvalue()
+
+def gtts_to_bytes(text, output_filepath):
+    """Synthesize speech with gTTS (no server-side playback) and return the mp3 bytes"""
+    text_to_speech_with_gtts(input_text=text, output_filepath=output_filepath, autoplay=False)
+    with open(output_filepath, 'rb') as audio_file:
+        return audio_file.read()
+
+def transcribe_file(audio_filepath, stt_model):
+    """Hash the audio file and return its (cached) transcription"""
+    with open(audio_filepath, 'rb') as f:
+        audio_hash = content_hash(f.read())
+    return cached_transcription(audio_hash, stt_model, audio_filepath)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def cached_encoding(image_hash, mime_type, _image_bytes):
+    """Base64-encode the downscaled image, memoized by image content hash.
+    The downscale itself is shared with the preview through cached_preview."""
+    image_bytes, mime_type = cached_preview(image_hash, mime_type, _image_bytes)
+    return encode_image_bytes(image_bytes), mime_type
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def cached_reduced_photo(image_hash, mime_type, _image_bytes):
+    """Shrink a camera capture for upload, memoized by image content hash"""
+    return reduce_photo(_image_bytes, mime_type)
+
+def hash_and_encode_image(image_bytes, mime_type):
+    """Return the content hash, base64 encoding and MIME type of image bytes,
+    downscaling large images before encoding"""
+    image_hash = content_hash(image_bytes)
+    encoded_image, mime_type = cached_encoding(image_hash, mime_type, image_bytes)
+    return image_hash, encoded_image, mime_type
+
+def process_inputs(audio_filepath, image_bytes, image_mime='image/jpeg', transcript=None):
+    """Process audio and image inputs (same logic as your gradio app).
+    A transcript already produced while recording skips the STT call."""
+    speech_to_text_output = transcript or ""
+
+    # STT and image encoding are independent, so start both right away;
+    # only the LLM call below has to wait for the transcript.
+    executor = get_executor()
+    stt_future = None
+    if transcript is None and audio_filepath and os.path.exists(audio_filepath):
+        stt_future = executor.submit(transcribe_file, audio_filepath, stt_model)
+    enc_future = None
+    if image_bytes:
+        enc_future = executor.submit(hash_and_encode_image, image_bytes, image_mime)
     
     # Process audio if provided
-    if audio_filepath and os.path.exists(audio_filepath):
+    if stt_future is not None:
         try:
-            speech_to_text_output = transcribe_with_groq(
-                GROQ_API_KEY=os.environ.get("GROQ_API_KEY"), 
-                audio_filepath=audio_filepath,
-                stt_model="whisper-large-v3"
-            )
+            speech_to_text_output = stt_future.result()
         except Exception as e:
             st.error(f"Error transcribing audio: {e}")
             speech_to_text_output = "Error transcribing audio"
 
     # Process image if provided
-    if image_filepath and os.path.exists(image_filepath):
+    if enc_future is not None:
         try:
-            encoded_image = encode_image(image_filepath)
-            doctor_response = analyze_image_with_query(
-                query=system_prompt + speech_to_text_output, 
-                encoded_image=encoded_image, 
-                model="meta-llama/llama-4-scout-17b-16e-instruct"
+            image_hash, encoded_image, image_mime = enc_future.result()
+            query = speech_to_text_output
+            doctor_response = cached_image_analysis(
+                image_hash,
+                # st.cache_data doesn't see globals, so the prompt must be part of the key
+                content_hash(system_prompt.encode('utf-8')),
+                content_hash(query.encode('utf-8')),
+                "meta-llama/llama-4-scout-17b-16e-instruct",
+                query,
+                encoded_image,
+                image_mime
             )
         except Exception as e:
             st.error(f"Error analyzing image: {e}")
@@ -73,23 +251,41 @@ def process_inputs(audio_filepath, image_filepath):
     # Generate voice response
     voice_filepath = None
     if doctor_response and doctor_response != "No image provided for me to analyze":
-        try:
-            voice_filepath = "doctor_response.mp3"
-            text_to_speech_with_elevenlabs(
-                input_text=doctor_response, 
-                output_filepath=voice_filepath
-            )
-        except Exception as e:
-            st.error(f"Error generating voice response: {e}")
-            try:
-                # Fallback to gTTS
-                text_to_speech_with_gtts(
-                    input_text=doctor_response, 
-                    output_filepath=voice_filepath
-                )
-            except Exception as e2:
-                st.error(f"Error with fallback TTS: {e2}")
-                voice_filepath = None
+        response_hash = content_hash(doctor_response.encode('utf-8'))
+        # ElevenLabs is the primary; if it hasn't answered within the hedge delay
+        # (or already failed), race gTTS against it and keep whichever succeeds first
+        el_stop = threading.Event()
+        tts_executor = get_tts_executor()
+        el_future = tts_executor.submit(cached_tts, response_hash, ELEVENLABS_VOICE, doctor_response, el_stop)
+        tts_paths = {el_future: tts_filepath(response_hash, ELEVENLABS_VOICE)}
+        done, _ = wait([el_future], timeout=TTS_HEDGE_DELAY)
+        if not done or el_future.exception() is not None:
+            gtts_path = tts_filepath(response_hash, "gtts")
+            tts_paths[tts_executor.submit(gtts_to_bytes, doctor_response, gtts_path)] = gtts_path
+
+        voice_bytes = None
+        pending = set(tts_paths)
+        while pending and voice_bytes is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    voice_bytes = future.result()
+                    voice_filepath = tts_paths[future]
+                    break
+                except Exception as e:
+                    st.error(f"Error generating voice response: {e}")
+        # cancel() only helps for futures that haven't started. A running ElevenLabs
+        # stream is told to stop and frees its worker at the next chunk; a running
+        # gTTS call is a single short request and is left to finish.
+        if voice_filepath != tts_paths[el_future]:
+            el_stop.set()
+        for future in pending:
+            future.cancel()
+
+        if voice_bytes is None:
+            st.session_state.pop('voice_bytes', None)
+        else:
+            st.session_state.voice_bytes = voice_bytes
 
     return speech_to_text_output, doctor_response, voice_filepath
 
@@ -114,11 +310,38 @@ def main():
     if st.button("🎤 Start Recording"):
         with st.spinner("Recording... Speak now!"):
             try:
-                audio_filepath = "recorded_audio.mp3"
-                record_audio(file_path=audio_filepath, timeout=10, phrase_time_limit=30)
+                get_tmp_lru()
+                with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix='.mp3', delete=False) as tmp_file:
+                    recording_path = tmp_file.name
+                live_transcript = st.empty()
+
+                def show_partial(text):
+                    # Segments are transcribed while recording continues
+                    st.session_state.speech_to_text = text
+                    live_transcript.caption(text)
+
+                try:
+                    transcript = record_and_transcribe(
+                        file_path=recording_path,
+                        stt_model=stt_model,
+                        GROQ_API_KEY=GROQ_API_KEY,
+                        timeout=10,
+                        phrase_time_limit=30,
+                        on_partial=show_partial,
+                        client=get_groq_client()
+                    )
+                    # Keep the recording under its content hash so it joins the bounded temp dir
+                    with open(recording_path, 'rb') as f:
+                        recording_bytes = f.read()
+                finally:
+                    # The capture file is never tracked by the LRU, so it must not outlive this block
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(recording_path)
+                audio_filepath = content_path(recording_bytes, '.mp3') if recording_bytes else None
                 st.success("Recording completed!")
-                # Store audio filepath in session state
+                # Store audio filepath and its transcript in session state
                 st.session_state.audio_filepath = audio_filepath
+                st.session_state.audio_transcript = transcript
             except Exception as e:
                 st.error(f"Recording failed: {e}")
 
@@ -129,41 +352,48 @@ def main():
         ["Upload Image", "Take Photo"]
     )
     
-    image_filepath = None
-    
     if image_input_method == "Upload Image":
         uploaded_image = st.file_uploader(
             "Choose an image file", 
             type=['jpg', 'jpeg', 'png', 'bmp']
         )
         if uploaded_image is not None:
-            image_filepath = save_uploaded_image(uploaded_image)
-            # Display the uploaded image
-            image = Image.open(uploaded_image)
-            st.image(image, caption="Uploaded Image", use_column_width=True)
-            # Store image filepath in session state
-            st.session_state.image_filepath = image_filepath
+            image_bytes, image_mime = save_uploaded_image(uploaded_image)
+            # Display the uploaded image from the static file server
+            st.image(
+                static_image_url(image_bytes, image_mime),
+                caption="Uploaded Image",
+                use_column_width=True
+            )
+            # Store image bytes in session state
+            st.session_state.image_bytes = image_bytes
+            st.session_state.image_mime = image_mime
             
     elif image_input_method == "Take Photo":
         camera_image = st.camera_input("Take a picture")
         if camera_image is not None:
-            image_filepath = save_uploaded_image(camera_image)
+            image_bytes, image_mime = save_uploaded_image(camera_image)
+            # The capture is re-read on every rerun; only reduce it once per photo
+            image_bytes, image_mime = cached_reduced_photo(content_hash(image_bytes), image_mime, image_bytes)
             st.success("Photo captured successfully!")
-            # Store image filepath in session state
-            st.session_state.image_filepath = image_filepath
+            # Store image bytes in session state
+            st.session_state.image_bytes = image_bytes
+            st.session_state.image_mime = image_mime
 
     # Process Button
     if st.button("🔍 Analyze", type="primary", use_container_width=True):
         # Get filepaths from session state if available
         current_audio = getattr(st.session_state, 'audio_filepath', None)
-        current_image = getattr(st.session_state, 'image_filepath', None)
+        current_image = getattr(st.session_state, 'image_bytes', None)
         
         if not current_audio and not current_image:
             st.warning("Please provide either audio input or image input (or both)")
         else:
             with st.spinner("Processing your request..."):
                 speech_to_text_output, doctor_response, voice_filepath = process_inputs(
-                    current_audio, current_image
+                    current_audio, current_image,
+                    image_mime=getattr(st.session_state, 'image_mime', 'image/jpeg'),
+                    transcript=getattr(st.session_state, 'audio_transcript', None)
                 )
                 
                 # Store results in session state
@@ -198,19 +428,21 @@ def main():
 
     # Display Audio Response
     if hasattr(st.session_state, 'voice_filepath') and st.session_state.voice_filepath:
-        if os.path.exists(st.session_state.voice_filepath):
-            st.subheader("🔊 Voice Response")
+        audio_bytes = st.session_state.get('voice_bytes')
+        if audio_bytes is None and os.path.exists(st.session_state.voice_filepath):
             with open(st.session_state.voice_filepath, 'rb') as audio_file:
                 audio_bytes = audio_file.read()
-                st.audio(audio_bytes, format='audio/mp3')
-                
-                # Download button for audio
-                st.download_button(
-                    label="📥 Download Audio Response",
-                    data=audio_bytes,
-                    file_name="doctor_response.mp3",
-                    mime="audio/mp3"
-                )
+        if audio_bytes:
+            st.subheader("🔊 Voice Response")
+            st.audio(audio_bytes, format='audio/mp3')
+            
+            # Download button for audio
+            st.download_button(
+                label="📥 Download Audio Response",
+                data=audio_bytes,
+                file_name="doctor_response.mp3",
+                mime="audio/mp3"
+            )
 
     # Footer
     st.markdown("---")
@@ -225,10 +457,12 @@ def main():
 
     # Cleanup temporary files on app restart
     if st.button("🧹 Clear Cache", help="Clear temporary files and reset the app"):
-        # Clear session state
-        for key in list(st.session_state.keys()):
-            del st.session_state[key]
-        st.experimental_rerun()
+        # Remove on-disk artifacts before their paths are dropped with the session state
+        for path in (st.session_state.get('voice_filepath'), st.session_state.get('audio_filepath')):
+            if path and os.path.exists(path):
+                os.remove(path)
+        st.session_state.clear()
+        st.rerun()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
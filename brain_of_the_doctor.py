@@ -8,18 +8,69 @@ import os
 GROQ_API_KEY=os.environ.get("GROQ_API_KEY")
 
 #Step2: Convert image to required format
-import base64
+# pybase64 is an optional drop-in with SIMD kernels; the stdlib C codec is the fallback
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 
 
 #image_path="acne.jpg"
 
 def encode_image(image_path):   
-    image_file=open(image_path, "rb")
-    return base64.b64encode(image_file.read()).decode('utf-8')
+    with open(image_path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode('ascii')
+
+def encode_image_bytes(image_bytes):
+    """Base64-encode image bytes that are already in memory"""
+    return base64.b64encode(image_bytes).decode('ascii')
+
+import io
+
+# The vision model works at roughly 1024px anyway, so phone-sized uploads are
+# shrunk before base64/upload; small files are passed through untouched.
+MAX_IMAGE_SIDE = 1024
+DOWNSCALE_MIN_BYTES = 400_000
+
+def downscale_image(image_bytes, mime_type="image/jpeg", max_side=MAX_IMAGE_SIDE):
+    """Return (bytes, mime_type) with the long edge capped at max_side as JPEG"""
+    if len(image_bytes) < DOWNSCALE_MIN_BYTES:
+        return image_bytes, mime_type
+    # Pillow is only imported once an image actually needs resizing
+    from PIL import Image, ImageOps
+    img = Image.open(io.BytesIO(image_bytes))
+    # Re-encoding drops the EXIF orientation tag, so apply it to the pixels first
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=85, optimize=True)
+    return buf.getvalue(), "image/jpeg"
+
+def reduce_photo(image_bytes, mime_type="image/jpeg", max_side=MAX_IMAGE_SIDE):
+    """Shrink a camera capture with Pillow's integer box-filter reduce() and
+    re-encode it as JPEG; captures already within max_side are returned as is"""
+    from PIL import Image
+    img = Image.open(io.BytesIO(image_bytes))
+    if max(img.size) <= max_side:
+        return image_bytes, mime_type
+    img = img.reduce(-(-max(img.size) // max_side))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=80)
+    return buf.getvalue(), "image/jpeg"
 
 #Step3: Setup Multimodal LLM 
+import functools
+import httpx
 from groq import Groq
 
+# One pooled HTTP client for the whole process (Groq and ElevenLabs) so repeated
+# calls reuse warm TLS connections; the voice modules import it from here
+http_client = httpx.Client(limits=httpx.Limits(max_connections=32, max_keepalive_connections=8))
+
 query = (
     "Look at the image and identify the injury. "
     "Reply only with the immediate emergency actions to take. "
@@ -31,25 +82,36 @@ model="meta-llama/llama-4-scout-17b-16e-instruct"
 #model = "meta-llama/llama-4-scout-17b-16e-instruct"
 #model="llama-3.2-90b-vision-preview" #Deprecated
 
-def analyze_image_with_query(query, model, encoded_image):
-    client = Groq()  
+@functools.cache
+def get_groq_client():
+    """Build the Groq client once per process; every module shares it"""
+    return Groq(api_key=os.environ.get("GROQ_API_KEY"), http_client=http_client)
+
+def analyze_image_with_query(query, model, encoded_image, mime_type="image/jpeg", system=None, client=None):
+    # A fixed system prompt goes in its own message so the identical prefix can be
+    # reused across calls; query then only carries the per-request text
+    if client is None:
+        client = get_groq_client()
+    content = []
+    if query:
+        content.append({
+            "type": "text", 
+            "text": query
+        })
+    content.append({
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{mime_type};base64,{encoded_image}",
+        },
+    })
     messages = [
         {
             "role": "user",
-            "content": [
-                {
-                    "type": "text", 
-                    "text": query
-                },
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{encoded_image}",
-                    },
-                },
-            ],
+            "content": content,
         }
     ]
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
     chat_completion = client.chat.completions.create(
         messages=messages,
         model=model
@@ -32,9 +32,13 @@ import elevenlabs
 from elevenlabs.client import ElevenLabs
 
 ELEVENLABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY")
+ELEVENLABS_VOICE = "Aria"
+
+# ElevenLabs calls reuse the process-wide connection pool defined with the LLM client
+from brain_of_the_doctor import http_client
 
 def text_to_speech_with_elevenlabs_old(input_text, output_filepath):
-    client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+    client = ElevenLabs(api_key=ELEVENLABS_API_KEY, httpx_client=http_client)
     audio = client.generate(
         text=input_text,
         voice="Aria",
@@ -46,7 +50,7 @@ def text_to_speech_with_elevenlabs_old(input_text, output_filepath):
 
 
 # ---------- UPDATED gTTS Function with Auto Play ----------
-def text_to_speech_with_gtts(input_text, output_filepath):
+def text_to_speech_with_gtts(input_text, output_filepath, autoplay=True):
     language = "en"
     audioobj = gTTS(
         text=input_text,
@@ -54,6 +58,8 @@ def text_to_speech_with_gtts(input_text, output_filepath):
         slow=False
     )
     audioobj.save(output_filepath)
+    if not autoplay:
+        return
     os_name = platform.system()
     try:
         if os_name == "Darwin":  # macOS
@@ -78,16 +84,48 @@ def text_to_speech_with_gtts(input_text, output_filepath):
 # text_to_speech_with_gtts(input_text=input_text, output_filepath="gtts_testing_autoplay.mp3")
 
 
-# ---------- UPDATED ElevenLabs Function with Auto Play ----------
-def text_to_speech_with_elevenlabs(input_text, output_filepath):
-    client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
-    audio = client.generate(
+# ---------- Streaming ElevenLabs Function ----------
+def stream_tts_with_elevenlabs(input_text, output_filepath, chunk_size=4096, voice=ELEVENLABS_VOICE,
+                               stop_event=None):
+    """Yield mp3 chunks from the ElevenLabs streaming endpoint as they arrive,
+    writing each one to output_filepath at the same time. If stop_event is set,
+    the stream is closed at the next chunk and the partial file is removed."""
+    client = ElevenLabs(api_key=ELEVENLABS_API_KEY, httpx_client=http_client)
+    audio_stream = client.generate(
         text=input_text,
-        voice="Aria",
+        voice=voice,
         output_format="mp3_22050_32",
-        model="eleven_turbo_v2"
+        model="eleven_turbo_v2",
+        stream=True
     )
-    elevenlabs.save(audio, output_filepath)
+    buffer = b""
+    try:
+        with open(output_filepath, "wb") as f:
+            for chunk in audio_stream:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                if not chunk:
+                    continue
+                f.write(chunk)
+                buffer += chunk
+                if len(buffer) >= chunk_size:
+                    yield buffer
+                    buffer = b""
+            else:
+                if buffer:
+                    yield buffer
+                return
+    finally:
+        # Closing the SDK generator releases the HTTP connection
+        if hasattr(audio_stream, "close"):
+            audio_stream.close()
+    os.remove(output_filepath)
+
+
+# ---------- UPDATED ElevenLabs Function with Auto Play ----------
+def text_to_speech_with_elevenlabs(input_text, output_filepath):
+    for _ in stream_tts_with_elevenlabs(input_text, output_filepath):
+        pass
 
     os_name = platform.system()
     try:
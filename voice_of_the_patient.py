@@ -1,6 +1,9 @@
 #Step1: Setup Audio recorder (ffmpeg & portaudio)
 # ffmpeg, portaudio, pyaudio
 import logging
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 import speech_recognition as sr
 from pydub import AudioSegment
 from io import BytesIO
@@ -48,17 +51,133 @@ audio_filepath="patient_voice_test_for_patient.mp3"
 import os
 from groq import Groq
 
+# Share brain_of_the_doctor's HTTP connection pool
+from brain_of_the_doctor import http_client, get_groq_client
+
 GROQ_API_KEY=os.environ.get("GROQ_API_KEY")
-stt_model="whisper-large-v3"
+# whisper-large-v3-turbo trades a small WER increase for noticeably lower latency,
+# which suits the short patient queries here; set GROQ_STT_MODEL=whisper-large-v3
+# when accuracy matters more than speed.
+stt_model=os.environ.get("GROQ_STT_MODEL", "whisper-large-v3-turbo")
 
-def transcribe_with_groq(stt_model, audio_filepath, GROQ_API_KEY):
-    client=Groq(api_key=GROQ_API_KEY)
+def transcribe_with_groq(stt_model, audio_filepath, GROQ_API_KEY, temperature=0, client=None, **kwargs):
+    # Groq does not expose beam_size; temperature=0 keeps decoding greedy.
+    # Extra kwargs are passed straight through to the transcription call.
+    # Without an explicit key the shared process-wide client is used.
+    if client is None:
+        if GROQ_API_KEY is None or GROQ_API_KEY == os.environ.get("GROQ_API_KEY"):
+            client=get_groq_client()
+        else:
+            client=Groq(api_key=GROQ_API_KEY, http_client=http_client)
     
-    audio_file=open(audio_filepath, "rb")
-    transcription=client.audio.transcriptions.create(
-        model=stt_model,
-        file=audio_file,
-        language="en"
-    )
+    with open(audio_filepath, "rb") as audio_file:
+        transcription=client.audio.transcriptions.create(
+            model=stt_model,
+            file=audio_file,
+            language="en",
+            temperature=temperature,
+            **kwargs
+        )
 
     return transcription.text
+
+
+def record_and_transcribe(file_path, stt_model, GROQ_API_KEY, timeout=10, phrase_time_limit=30,
+                          segment_time_limit=15, on_partial=None, client=None):
+    """
+    Record from the microphone in pause-bounded segments and transcribe each
+    segment with Groq while the next one is being captured. Each segment is
+    transcribed with the text before it as the Whisper prompt, so the pieces
+    read as one transcript.
+
+    Args:
+    file_path (str): Path to save the full recording as an MP3 file.
+    stt_model (str): Groq speech to text model.
+    GROQ_API_KEY (str): Groq API key.
+    timeout (int): Maximum time to wait for speech to start (in seconds).
+    phrase_time_limit (int): Maximum total recording time (in seconds).
+    segment_time_limit (int): Safety cap on one segment (in seconds); segments
+        normally end at a pause so words are not cut.
+    on_partial (callable): Called with the running transcript as segments finish.
+    client (Groq): Optional shared Groq client.
+
+    Returns:
+    str: The transcript of the whole recording, or None if any segment failed to
+    transcribe (the saved recording can then be transcribed as a whole).
+    """
+    recognizer = sr.Recognizer()
+    segments = []
+    futures = []
+    texts = []
+
+    def segment_text(future):
+        # A failed segment must not abort capture; it counts as missing text
+        try:
+            return future.result().strip()
+        except Exception as e:
+            logging.error(f"Segment transcription failed: {e}")
+            return None
+
+    def transcribe_segment(wav_bytes, previous):
+        # Segments are uploaded as 16 kHz 16-bit WAV: speech_recognition already
+        # captures int16 PCM, Whisper resamples to 16 kHz anyway, and skipping the
+        # per-segment MP3 encode avoids an ffmpeg process for every segment
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
+            tmp_file.write(wav_bytes)
+            segment_path = tmp_file.name
+        try:
+            # Earlier segments were submitted first, so waiting on them cannot deadlock;
+            # their text is usually ready by the time this segment has been captured.
+            # Whisper only uses the last ~224 prompt tokens.
+            context = " ".join(t for t in map(segment_text, previous) if t)[-800:]
+            kwargs = {"prompt": context} if context else {}
+            return transcribe_with_groq(stt_model=stt_model, audio_filepath=segment_path,
+                                        GROQ_API_KEY=GROQ_API_KEY, client=client, **kwargs)
+        finally:
+            os.remove(segment_path)
+
+    def collect(wait=False):
+        # Segments are merged strictly in capture order
+        while len(texts) < len(futures) and (wait or futures[len(texts)].done()):
+            texts.append(segment_text(futures[len(texts)]))
+            if on_partial is not None:
+                on_partial(" ".join(t for t in texts if t))
+
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            with sr.Microphone() as source:
+                logging.info("Adjusting for ambient noise...")
+                recognizer.adjust_for_ambient_noise(source, duration=1)
+                logging.info("Start speaking now...")
+
+                start = time.monotonic()
+                wait_timeout = timeout
+                while time.monotonic() - start < phrase_time_limit:
+                    remaining = phrase_time_limit - (time.monotonic() - start)
+                    try:
+                        # listen() returns at the first pause (or at the time limit)
+                        audio_data = recognizer.listen(source, timeout=wait_timeout,
+                                                       phrase_time_limit=min(segment_time_limit, remaining))
+                    except sr.WaitTimeoutError:
+                        break
+                    # After the first segment, a short silence means the patient is done
+                    wait_timeout = recognizer.pause_threshold + 0.5
+                    segments.append(AudioSegment.from_wav(BytesIO(audio_data.get_wav_data())))
+                    futures.append(executor.submit(
+                        transcribe_segment,
+                        audio_data.get_wav_data(convert_rate=16000, convert_width=2),
+                        list(futures)
+                    ))
+                    collect()
+                logging.info("Recording complete.")
+
+            collect(wait=True)
+    finally:
+        # Whatever was captured is saved, even if capture or STT went wrong
+        if segments:
+            sum(segments[1:], segments[0]).export(file_path, format="mp3", bitrate="128k")
+            logging.info(f"Audio saved to {file_path}")
+
+    if None in texts:
+        return None
+    return " ".join(t for t in texts if t)